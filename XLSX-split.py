@@ -2,17 +2,26 @@ import csv
 import os
 import argparse
 import configparser
-import codecs
+import contextlib
 from openpyxl import load_workbook
 
+# 文件名中不允许出现的字符（以Windows为准）统一替换为下划线
+FILENAME_TRANS = str.maketrans({c: '_' for c in '\\/:*?"<>|'})
+
+
+def split_config_list(value):
+    """将逗号分隔的配置值拆成列表，去掉每项首尾空白并忽略空项"""
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
 # 解析命令行参数
 parser = argparse.ArgumentParser(description='Process XLSX data and generate CSV files.')
 parser.add_argument('-c', '--config', default='config.ini', help='path to the configuration file')
 args = parser.parse_args()
 
-# 读取配置文件
+# 读取配置文件（utf-8-sig 兼容记事本保存时带 BOM 的配置文件）
 config = configparser.ConfigParser()
-with codecs.open(args.config, 'r', encoding='utf-8') as file:
+with open(args.config, 'r', encoding='utf-8-sig') as file:
     config.read_file(file)
 
 # 获取配置信息
@@ -23,57 +32,68 @@ csv_encoding = config.get('General', 'csv_encoding', fallback='utf-8')
 department_column_name = config.get('General', 'KEY', fallback='二级部门名称')
 del_key = config.get('General', 'DELKEY', fallback='姓名')  # 读取DELKEY
 
-tag_departments = {}
+# 建立 部门 -> 标签 的反查表，每行只需一次字典查找；同一部门出现在多个标签下时以先配置的为准
+department_tags = {}
 for tag, departments in config.items('TagDepartments'):
-    tag_departments[tag] = [dep.strip() for dep in departments.split(',')]
-
-# 读取DELLIST的内容
-name_list = config.get('DELLIST', del_key, fallback="").split(", ")
-
-# 读取XLSX文件
-workbook = load_workbook(xlsx_file)
-
-# 检查是否存在名为 raw_sheet_name 的子表
-if raw_sheet_name in workbook.sheetnames:
-    sheet = workbook[raw_sheet_name]
-
-    # 读取表格数据
-    data = []
-    columns_to_process = config.get('ColumnMappings', raw_sheet_name, fallback="姓名, 邮箱前缀, 一级部门名称, 二级部门名称").split(",")
-    print("列名称:", columns_to_process)
-
-    for row in sheet.iter_rows(min_row=2, values_only=True):
-        row_data = {}
-        for index, column in enumerate(columns_to_process):
-            row_data[column] = row[index]
-
-        # 如果姓名在DELLIST里面，则跳过这一行
-        if row_data.get(del_key) in name_list:
-            continue
-
-        data.append(row_data)
-
-    # 添加标签字段
-    for row in data:
-        for tag, departments in tag_departments.items():
-            if row[department_column_name] in departments:
-                row['标签'] = tag
-                break
-        else:
-            row['标签'] = '其他'
-
-    # 根据标签生成多个CSV表
-    tags = set(row['标签'] for row in data)
-    for tag in tags:
-        filename = f"{tag}.csv"
-        filepath = os.path.join(output_directory, filename)
-        tag_data = [row for row in data if row['标签'] == tag]
-
-        with open(filepath, mode='w', newline='', encoding=csv_encoding) as file:
-            writer = csv.DictWriter(file, fieldnames=tag_data[0].keys())
-            writer.writeheader()
-            writer.writerows(tag_data)
-
-        print(f"已生成CSV文件: {filepath}")
-else:
-    print(f"名为 '{raw_sheet_name}' 的子表不存在。")
+    for dep in split_config_list(departments):
+        department_tags.setdefault(dep, tag)
+
+# 读取DELLIST的内容（用集合保存，逐行判断时为O(1)查找）
+name_list = frozenset(split_config_list(config.get('DELLIST', del_key, fallback="")))
+
+# 读取XLSX文件（只读模式按行流式解析，不构建完整的单元格对象）
+# 只读模式会保持文件句柄打开，用 closing 保证出错时也能关闭
+with contextlib.closing(load_workbook(xlsx_file, read_only=True)) as workbook:
+    # 检查是否存在名为 raw_sheet_name 的子表
+    if raw_sheet_name in workbook.sheetnames:
+        sheet = workbook[raw_sheet_name]
+        # 只读模式按 <dimension> 标签确定行范围，部分导出工具写入的值不准确（如 "A1"），
+        # 会导致后面的行被静默丢弃；重置后按实际存在的行读取，列范围由 iter_rows 的 max_col 限定
+        sheet.reset_dimensions()
+
+        columns_to_process = split_config_list(config.get('ColumnMappings', raw_sheet_name, fallback="姓名, 邮箱前缀, 一级部门名称, 二级部门名称"))
+        print("列名称:", columns_to_process)
+        column_count = len(columns_to_process)
+        fieldnames = columns_to_process + ['标签']
+
+        # 预先算好KEY列和DELKEY列的位置，逐行直接按下标取值
+        department_index = columns_to_process.index(department_column_name)
+        del_index = columns_to_process.index(del_key) if name_list and del_key in columns_to_process else None
+
+        # 根据标签生成多个CSV表：边读边写，某个标签第一次出现时才创建对应的CSV文件，
+        # 行数据读出后直接写入，不在内存中缓存整张表
+        tag_writers = {}
+        file_writers = {}
+        with contextlib.ExitStack() as stack:
+            # 只读取需要处理的前 column_count 列，缺失的单元格由openpyxl补为None
+            for row in sheet.iter_rows(min_row=2, max_col=column_count, values_only=True):
+                # 跳过整行为空的行（如表尾只带格式的空行），tuple.count 在C层完成判断
+                if row.count(None) == column_count:
+                    continue
+
+                # 如果姓名在DELLIST里面，则跳过这一行（未配置DELLIST时不做检查）
+                if del_index is not None and row[del_index] in name_list:
+                    continue
+
+                # 添加标签字段
+                tag = department_tags.get(row[department_index], '其他')
+                writer = tag_writers.get(tag)
+                if writer is None:
+                    filename = f"{tag.translate(FILENAME_TRANS)}.csv"
+                    filepath = os.path.join(output_directory, filename)
+                    # 不同标签清洗后可能得到同一个文件名（如 C/x 与 C_x），按文件路径共用一个writer，
+                    # 避免重复打开同一文件互相覆盖；标签列仍保留各自的原始标签
+                    writer = file_writers.get(filepath)
+                    if writer is None:
+                        file = stack.enter_context(open(filepath, mode='w', newline='', encoding=csv_encoding))
+                        writer = csv.writer(file)
+                        writer.writerow(fieldnames)
+                        file_writers[filepath] = writer
+                    tag_writers[tag] = writer
+
+                writer.writerow(row + (tag,))
+
+        for filepath in file_writers:
+            print(f"已生成CSV文件: {filepath}")
+    else:
+        print(f"名为 '{raw_sheet_name}' 的子表不存在。")